@@ -1,11 +1,57 @@
 // Jackson Coxson
 
+use std::{
+    collections::HashMap,
+    sync::{LazyLock, Mutex},
+    time::{Duration, Instant},
+};
+
 use idevice::pairing_file::PairingFile;
 use log::info;
 
+const UDID_CACHE_TTL: Duration = Duration::from_secs(30);
+
+/// IP -> (UDID, looked up at), so a burst of requests from one device hits the database once
+static UDID_CACHE: LazyLock<Mutex<HashMap<String, (String, Instant)>>> =
+    LazyLock::new(Default::default);
+
+/// Drops any cached lookups pointing at this UDID, called when the device re-registers
+pub fn invalidate_udid(udid: &str) {
+    UDID_CACHE
+        .lock()
+        .unwrap()
+        .retain(|_, (cached, _)| cached.as_str() != udid);
+}
+
+/// Caches the device's new IP right after registering, dropping whatever IP it had before
+pub fn cache_udid(ip: String, udid: String) {
+    let mut cache = UDID_CACHE.lock().unwrap();
+    cache.retain(|_, (cached, _)| *cached != udid);
+    cache.insert(ip, (udid, Instant::now()));
+}
+
 pub async fn get_udid_from_ip(ip: String) -> Result<String, String> {
+    let cached = UDID_CACHE
+        .lock()
+        .unwrap()
+        .get(&ip)
+        .filter(|(_, looked_up)| looked_up.elapsed() < UDID_CACHE_TTL)
+        .map(|(udid, _)| udid.clone());
+    if let Some(udid) = cached {
+        return Ok(udid);
+    }
+
+    let udid = lookup_udid(ip.clone()).await?;
+    UDID_CACHE
+        .lock()
+        .unwrap()
+        .insert(ip, (udid.clone(), Instant::now()));
+    Ok(udid)
+}
+
+async fn lookup_udid(ip: String) -> Result<String, String> {
     tokio::task::spawn_blocking(move || {
-        let db = match sqlite::open("jitstreamer.db") {
+        let db = match crate::db::open() {
             Ok(db) => db,
             Err(e) => {
                 info!("Failed to open database: {:?}", e);
@@ -14,7 +60,7 @@ pub async fn get_udid_from_ip(ip: String) -> Result<String, String> {
         };
 
         // Get the device from the database
-        let query = "SELECT udid FROM devices WHERE ip = ?";
+        let query = crate::db::SELECT_UDID_BY_IP;
         let mut statement = match crate::db::db_prepare(&db, query) {
             Some(s) => s,
             None => {
@@ -24,7 +70,7 @@ pub async fn get_udid_from_ip(ip: String) -> Result<String, String> {
         };
         statement.bind((1, ip.as_str())).unwrap();
         let udid = if let Some(sqlite::State::Row) = crate::db::statement_next(&mut statement) {
-            let udid = statement.read::<String, _>("udid").unwrap();
+            let udid = statement.read::<String, _>(0).unwrap();
             info!("Found device with udid {}", udid);
             udid
         } else {
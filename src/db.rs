@@ -1,28 +1,70 @@
 // Jackson Coxson
 // Code to retry a few times until the database isn't locked.
 
+use std::time::{Duration, Instant};
+
 use sqlite::{Connection, State, Statement};
 
-pub fn db_prepare<'a>(db: &'a Connection, query: &str) -> Option<Statement<'a>> {
-    for _ in 0..50 {
-        match db.prepare(query) {
-            Ok(s) => return Some(s),
-            Err(_) => {
-                std::thread::sleep(std::time::Duration::from_millis(100));
-            }
-        }
+const DB_PATH: &str = "jitstreamer.db";
+
+// Lock waits are left to the retry helpers below, so no busy_timeout here
+const CONNECTION_PRAGMAS: &str = "
+PRAGMA temp_store = MEMORY;
+";
+
+pub const SELECT_UDID_BY_IP: &str = "SELECT udid FROM devices WHERE ip = ?";
+pub const DELETE_DEVICE_RETURNING_IP: &str = "DELETE FROM devices WHERE udid = ? RETURNING ip";
+pub const INSERT_DEVICE: &str =
+    "INSERT INTO devices (udid, ip, last_used) VALUES (?, ?, CURRENT_TIMESTAMP)";
+
+const SQLITE_BUSY: isize = 5;
+const SQLITE_LOCKED: isize = 6;
+
+/// Only lock contention is worth waiting out, anything else will fail again
+fn is_locked(e: &sqlite::Error) -> bool {
+    matches!(e.code, Some(SQLITE_BUSY) | Some(SQLITE_LOCKED))
+}
+
+/// Opens the database and applies the connection tuning
+pub fn open() -> Result<Connection, sqlite::Error> {
+    let db = sqlite::open(DB_PATH)?;
+    db.execute(CONNECTION_PRAGMAS)?;
+    Ok(db)
+}
+
+/// Runs a batch of statements as one transaction, so they cost a single commit
+pub fn execute_transaction(db: &Connection, statements: &str) -> Result<(), sqlite::Error> {
+    db.execute("BEGIN")?;
+    if let Err(e) = db.execute(statements) {
+        db.execute("ROLLBACK").ok();
+        return Err(e);
     }
-    None
+    db.execute("COMMIT")
 }
 
-pub fn statement_next(statement: &mut Statement) -> Option<State> {
-    for _ in 0..50 {
-        match statement.next() {
-            Ok(s) => return Some(s),
-            Err(_) => {
-                std::thread::sleep(std::time::Duration::from_millis(100));
+/// Retries while the database is locked, backing off from 10ms up to 1s for at most 5s
+fn with_retry<T>(mut f: impl FnMut() -> Result<T, sqlite::Error>) -> Option<T> {
+    let deadline = Instant::now() + Duration::from_secs(5);
+    let mut delay = Duration::from_millis(10);
+    loop {
+        match f() {
+            Ok(t) => return Some(t),
+            Err(e) if is_locked(&e) && Instant::now() < deadline => {
+                std::thread::sleep(delay);
+                delay = (delay * 2).min(Duration::from_secs(1));
+            }
+            Err(e) => {
+                log::error!("Database error: {e:?}");
+                return None;
             }
         }
     }
-    None
+}
+
+pub fn db_prepare<'a>(db: &'a Connection, query: &str) -> Option<Statement<'a>> {
+    with_retry(|| db.prepare(query))
+}
+
+pub fn statement_next(statement: &mut Statement) -> Option<State> {
+    with_retry(|| statement.next())
 }
@@ -8,7 +8,6 @@ use idevice::{
     IdeviceService,
 };
 use log::debug;
-use tokio::sync::oneshot::error::TryRecvError;
 
 pub enum SendRequest {
     Store((String, tokio::sync::oneshot::Sender<()>)),
@@ -38,6 +37,26 @@ pub fn heartbeat() -> NewHeartbeatSender {
     sender
 }
 
+/// Starts a heartbeat for the device and hands it to the orchestrator.
+/// Returns a message fit to show the user if the device couldn't be reached.
+pub async fn start_heartbeat(
+    sender: &NewHeartbeatSender,
+    udid: String,
+    ip: IpAddr,
+    pairing_file: &PairingFile,
+) -> Result<(), String> {
+    match heartbeat_thread(udid.clone(), ip, pairing_file).await {
+        Ok(s) => {
+            sender.send(SendRequest::Store((udid, s))).await.unwrap();
+            Ok(())
+        }
+        Err(IdeviceError::InvalidHostID) => {
+            Err("your pairing file is invalid. Regenerate it with jitterbug pair.".to_string())
+        }
+        Err(e) => Err(e.to_string()),
+    }
+}
+
 pub async fn heartbeat_thread(
     udid: String,
     ip: IpAddr,
@@ -57,7 +76,15 @@ pub async fn heartbeat_thread(
     tokio::task::spawn(async move {
         let interval = 30;
         loop {
-            let _ = match heartbeat_client.get_marco(interval).await {
+            // Wake up as soon as we're told to stop instead of waiting for the next marco
+            let marco = tokio::select! {
+                _ = &mut receiver => {
+                    debug!("Stopping heartbeat for {udid}");
+                    break;
+                }
+                marco = heartbeat_client.get_marco(interval) => marco,
+            };
+            let _ = match marco {
                 Ok(interval) => interval,
                 Err(e) => {
                     debug!("Failed to get marco for {udid}: {e:?}");
@@ -68,11 +95,6 @@ pub async fn heartbeat_thread(
                 debug!("Failed to send polo for {udid}");
                 break;
             }
-            match receiver.try_recv() {
-                Ok(_) => break,
-                Err(TryRecvError::Closed) => break,
-                Err(TryRecvError::Empty) => {}
-            }
         }
     });
     Ok(sender)
@@ -64,11 +64,16 @@ async fn main() {
     if allow_registration == 1 {
         register::check_wireguard();
     }
-    if !std::fs::exists("jitstreamer.db").unwrap() {
+    let create_db = !std::fs::exists("jitstreamer.db").unwrap();
+    let db = db::open().unwrap();
+    if create_db {
         info!("Creating database");
-        let db = sqlite::open("jitstreamer.db").unwrap();
-        db.execute(include_str!("sql/up.sql")).unwrap();
+        db::execute_transaction(&db, include_str!("sql/up.sql")).unwrap();
     }
+    if let Err(e) = db::execute_transaction(&db, include_str!("sql/indexes.sql")) {
+        log::warn!("Failed to create database indexes: {e:?}");
+    }
+    std::mem::drop(db);
 
     // Create a heartbeat manager
     let state = JitStreamerState {
@@ -201,29 +206,17 @@ async fn get_apps(
     };
 
     // Heartbeat the device
-    match heartbeat::heartbeat_thread(udid.clone(), ip, &pairing_file).await {
-        Ok(s) => {
-            state
-                .new_heartbeat_sender
-                .send(heartbeat::SendRequest::Store((udid.clone(), s)))
-                .await
-                .unwrap();
-        }
-        Err(e) => {
-            let e = match e {
-                idevice::IdeviceError::InvalidHostID => {
-                    "your pairing file is invalid. Regenerate it with jitterbug pair.".to_string()
-                }
-                _ => e.to_string(),
-            };
-            info!("Failed to heartbeat device: {:?}", e);
-            return Json(GetAppsReturn {
-                ok: false,
-                apps: Vec::new(),
-                bundle_ids: None,
-                error: Some(format!("Failed to heartbeat device: {e}")),
-            });
-        }
+    if let Err(e) =
+        heartbeat::start_heartbeat(&state.new_heartbeat_sender, udid.clone(), ip, &pairing_file)
+            .await
+    {
+        info!("Failed to heartbeat device: {:?}", e);
+        return Json(GetAppsReturn {
+            ok: false,
+            apps: Vec::new(),
+            bundle_ids: None,
+            error: Some(format!("Failed to heartbeat device: {e}")),
+        });
     }
 
     // Connect to the device and get the list of bundle IDs
@@ -372,30 +365,18 @@ async fn launch_app(
     };
 
     // Heartbeat the device
-    match heartbeat::heartbeat_thread(udid.clone(), ip, &pairing_file).await {
-        Ok(s) => {
-            state
-                .new_heartbeat_sender
-                .send(heartbeat::SendRequest::Store((udid.clone(), s)))
-                .await
-                .unwrap();
-        }
-        Err(e) => {
-            let e = match e {
-                idevice::IdeviceError::InvalidHostID => {
-                    "your pairing file is invalid. Regenerate it with jitterbug pair.".to_string()
-                }
-                _ => e.to_string(),
-            };
-            info!("Failed to heartbeat device: {:?}", e);
-            return Json(LaunchAppReturn {
-                ok: false,
-                launching: false,
-                position: None,
-                mounting: false,
-                error: Some(format!("Failed to heartbeat device: {e}")),
-            });
-        }
+    if let Err(e) =
+        heartbeat::start_heartbeat(&state.new_heartbeat_sender, udid.clone(), ip, &pairing_file)
+            .await
+    {
+        info!("Failed to heartbeat device: {:?}", e);
+        return Json(LaunchAppReturn {
+            ok: false,
+            launching: false,
+            position: None,
+            mounting: false,
+            error: Some(format!("Failed to heartbeat device: {e}")),
+        });
     }
 
     let provider = TcpProvider {
@@ -683,26 +664,14 @@ async fn attach_app(
     };
 
     // Heartbeat the device
-    match heartbeat::heartbeat_thread(udid.clone(), ip, &pairing_file).await {
-        Ok(s) => {
-            state
-                .new_heartbeat_sender
-                .send(heartbeat::SendRequest::Store((udid.clone(), s)))
-                .await
-                .unwrap();
-        }
-        Err(e) => {
-            let e = match e {
-                idevice::IdeviceError::InvalidHostID => {
-                    "your pairing file is invalid. Regenerate it with jitterbug pair.".to_string()
-                }
-                _ => e.to_string(),
-            };
-            info!("Failed to heartbeat device: {:?}", e);
-            return Json(AttachReturn::fail(format!(
-                "Failed to heartbeat device: {e}"
-            )));
-        }
+    if let Err(e) =
+        heartbeat::start_heartbeat(&state.new_heartbeat_sender, udid.clone(), ip, &pairing_file)
+            .await
+    {
+        info!("Failed to heartbeat device: {:?}", e);
+        return Json(AttachReturn::fail(format!(
+            "Failed to heartbeat device: {e}"
+        )));
     }
 
     let provider = TcpProvider {
@@ -93,8 +93,107 @@ pub async fn check_mount(
             mounting: true,
         });
     }
+
+    // Claim the device before letting go of the lock so a second request can't start another
+    // mount, but don't hold the lock while we talk to the device
+    let (sender, receiver) = watch::channel(Ok((0, 100, false)));
+    lock.insert(udid.clone(), receiver.clone());
     std::mem::drop(lock);
+    let mut claim = MountClaim {
+        cache: state.mount_cache.clone(),
+        udid: udid.clone(),
+        receiver,
+        sender: Some(sender),
+    };
 
+    let res = check_and_mount(ip, udid, &state, &mut claim).await;
+    if !res.mounting {
+        // Let anyone watching the claim know how the check ended
+        claim.finish(match &res.error {
+            Some(e) => Err(e.clone()),
+            None => Ok((1, 1, true)),
+        });
+        // Clear the entry before replying so the next request does a fresh check
+        claim.release().await;
+    }
+    res
+}
+
+/// A device's slot in the mount cache, held while we check whether it needs mounting.
+/// Unless the sender is handed off to a mount or the claim is released, dropping this frees
+/// the slot in the background, so an interrupted request can't leave the device stuck as mounting.
+struct MountClaim {
+    cache: MountCache,
+    udid: String,
+    receiver: watch::Receiver<Result<(usize, usize, bool), String>>,
+    sender: Option<watch::Sender<Result<(usize, usize, bool), String>>>,
+}
+
+impl MountClaim {
+    /// Hands the sender to the mount, which owns the cache entry from then on
+    fn start(&mut self) -> watch::Sender<Result<(usize, usize, bool), String>> {
+        self.sender.take().unwrap()
+    }
+
+    fn finish(&mut self, result: Result<(usize, usize, bool), String>) {
+        if let Some(sender) = &self.sender {
+            sender.send(result).ok();
+        }
+    }
+
+    /// Removes the entry now, leaving nothing for drop to clean up
+    async fn release(mut self) {
+        self.sender = None;
+        let mut lock = self.cache.lock().await;
+        if is_claim(&lock, &self.udid, &self.receiver) {
+            lock.remove(&self.udid);
+        }
+    }
+}
+
+/// Someone may have already cleared our entry and claimed the device again
+fn is_claim(
+    cache: &HashMap<String, watch::Receiver<Result<(usize, usize, bool), String>>>,
+    udid: &str,
+    receiver: &watch::Receiver<Result<(usize, usize, bool), String>>,
+) -> bool {
+    cache.get(udid).is_some_and(|r| r.same_channel(receiver))
+}
+
+impl Drop for MountClaim {
+    fn drop(&mut self) {
+        let Some(sender) = self.sender.take() else {
+            return;
+        };
+        if matches!(*sender.borrow(), Ok((_, _, false))) {
+            sender
+                .send(Err("Mount check was interrupted".to_string()))
+                .ok();
+        }
+
+        let Ok(runtime) = tokio::runtime::Handle::try_current() else {
+            return;
+        };
+        let cache = self.cache.clone();
+        let udid = std::mem::take(&mut self.udid);
+        let receiver = self.receiver.clone();
+        runtime.spawn(async move {
+            let mut lock = cache.lock().await;
+            if is_claim(&lock, &udid, &receiver) {
+                lock.remove(&udid);
+            }
+        });
+    }
+}
+
+/// Checks for the developer image and starts mounting it if it's missing.
+/// The caller has already claimed the device in the mount cache.
+async fn check_and_mount(
+    ip: SecureClientIp,
+    udid: String,
+    state: &JitStreamerState,
+    claim: &mut MountClaim,
+) -> Json<CheckMountResponse> {
     let pairing_file = match common::get_pairing_file(&udid, &state.pairing_file_storage).await {
         Ok(p) => p,
         Err(e) => {
@@ -107,28 +206,20 @@ pub async fn check_mount(
     };
 
     // Start a heartbeat, get the list of images
-    match heartbeat::heartbeat_thread(udid.clone(), ip.0, &pairing_file).await {
-        Ok(s) => {
-            state
-                .new_heartbeat_sender
-                .send(heartbeat::SendRequest::Store((udid.clone(), s)))
-                .await
-                .unwrap();
-        }
-        Err(e) => {
-            let e = match e {
-                idevice::IdeviceError::InvalidHostID => {
-                    "your pairing file is invalid. Regenerate it with jitterbug pair.".to_string()
-                }
-                _ => e.to_string(),
-            };
-            info!("Failed to heartbeat device: {:?}", e);
-            return Json(CheckMountResponse {
-                ok: false,
-                mounting: false,
-                error: Some(format!("Failed to heartbeat device: {e}")),
-            });
-        }
+    if let Err(e) = heartbeat::start_heartbeat(
+        &state.new_heartbeat_sender,
+        udid.clone(),
+        ip.0,
+        &pairing_file,
+    )
+    .await
+    {
+        info!("Failed to heartbeat device: {:?}", e);
+        return Json(CheckMountResponse {
+            ok: false,
+            mounting: false,
+            error: Some(format!("Failed to heartbeat device: {e}")),
+        });
     }
 
     // Get the list of mounted images
@@ -181,14 +272,12 @@ pub async fn check_mount(
             mounting: false,
         })
     } else {
-        let (sw, rw) = watch::channel(Ok((0, 100, false)));
         mount_thread(
             provider,
-            sw,
+            claim.start(),
             state.new_heartbeat_sender.clone(),
-            udid.clone(),
+            udid,
         );
-        state.mount_cache.lock().await.insert(udid, rw);
 
         Json(CheckMountResponse {
             ok: true,
@@ -213,24 +302,25 @@ fn mount_thread(
             hb: NewHeartbeatSender,
             udid: String,
         ) -> Result<(), IdeviceError> {
-            debug!("Getting chip ID for {udid}");
-            let mut lockdown_client = LockdowndClient::connect(&provider).await?;
-            lockdown_client
-                .start_session(&provider.get_pairing_file().await?)
-                .await?;
+            // The chip ID lookup and the mounter connection are independent, do them together
+            let chip_id = async {
+                debug!("Getting chip ID for {udid}");
+                let mut lockdown_client = LockdowndClient::connect(&provider).await?;
+                lockdown_client
+                    .start_session(&provider.get_pairing_file().await?)
+                    .await?;
 
-            let unique_chip_id = match lockdown_client
-                .get_value("UniqueChipID")
-                .await?
-                .as_unsigned_integer()
-            {
-                Some(u) => u,
-                None => {
-                    return Err(IdeviceError::UnexpectedResponse);
+                match lockdown_client
+                    .get_value("UniqueChipID")
+                    .await?
+                    .as_unsigned_integer()
+                {
+                    Some(u) => Ok(u),
+                    None => Err(IdeviceError::UnexpectedResponse),
                 }
             };
-
-            let mut mounter_client = ImageMounter::connect(&provider).await?;
+            let (unique_chip_id, mut mounter_client) =
+                tokio::try_join!(chip_id, ImageMounter::connect(&provider))?;
             mounter_client
                 .mount_personalized_with_callback(
                     &provider,
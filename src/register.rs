@@ -64,7 +64,7 @@ pub async fn register(
     let cloned_udid = udid.clone();
     // Reverse lookup the device to see if we already have an IP for it
     let ip = match tokio::task::spawn_blocking(move || {
-        let db = match sqlite::open("jitstreamer.db") {
+        let db = match crate::db::open() {
             Ok(db) => db,
             Err(e) => {
                 info!("Failed to open database: {:?}", e);
@@ -72,8 +72,8 @@ pub async fn register(
             }
         };
 
-        // Get the device from the database
-        let query = "SELECT ip FROM devices WHERE udid = ?";
+        // Remove the device from the database, getting back the IP it had
+        let query = crate::db::DELETE_DEVICE_RETURNING_IP;
         let mut statement = match crate::db::db_prepare(&db, query) {
             Some(s) => s,
             None => {
@@ -81,29 +81,11 @@ pub async fn register(
                 return None;
             }
         };
-        statement
-            .bind((1, cloned_udid.to_string().as_str()))
-            .unwrap();
+        statement.bind((1, cloned_udid.as_str())).unwrap();
         if let Some(State::Row) = crate::db::statement_next(&mut statement) {
-            let ip = statement.read::<String, _>("ip").unwrap();
+            let ip = statement.read::<String, _>(0).unwrap();
             info!("Found device with udid {} already in db", cloned_udid);
-
-            // Delete the device from the database
-            let query = "DELETE FROM devices WHERE udid = ?";
-            let mut statement = match crate::db::db_prepare(&db, query) {
-                Some(s) => s,
-                None => {
-                    log::error!("Failed to prepare query!");
-                    return None;
-                }
-            };
-            statement
-                .bind((1, cloned_udid.to_string().as_str()))
-                .unwrap();
-            if crate::db::statement_next(&mut statement).is_none() {
-                log::error!("Failed to enact the statement");
-            }
-
+            crate::common::invalidate_udid(&cloned_udid);
             Some(ip)
         } else {
             None
@@ -128,103 +110,17 @@ pub async fn register(
 
     if register_mode == 1 {
         // register using wireguard
-        let wireguard_config_name =
-            std::env::var("WIREGUARD_CONFIG_NAME").unwrap_or("jitstreamer".to_string());
-        let wireguard_conf = format!("/etc/wireguard/{wireguard_config_name}.conf");
-        let wireguard_port = std::env::var("WIREGUARD_PORT")
-            .unwrap_or("51869".to_string())
-            .parse::<u16>()
-            .unwrap_or(51869);
-        let wireguard_server_address =
-            std::env::var("WIREGUARD_SERVER_ADDRESS").unwrap_or("fd00::/128".to_string());
-        let wireguard_endpoint =
-            std::env::var("WIREGUARD_ENDPOINT").unwrap_or("jitstreamer.jkcoxson.com".to_string());
-        let wireguard_server_allowed_ips =
-            std::env::var("WIREGUARD_SERVER_ALLOWED_IPS").unwrap_or("fd00::/64".to_string());
-
-        // Read the Wireguard config file
-        info!("Reading Wireguard server config");
-        let mut server_peer = match wg_config::WgConf::open(&wireguard_conf) {
-            Ok(conf) => conf,
-            Err(e) => {
-                info!("Failed to open Wireguard config: {:?}", e);
-                if let wg_config::WgConfError::NotFound(_) = e {
-                    // Generate a new one
-
-                    let key =
-                        wg_config::WgKey::generate_private_key().expect("failed to generate key");
-                    let interface = wg_config::WgInterface::new(
-                        key,
-                        wireguard_server_address.parse().unwrap(),
-                        Some(wireguard_port),
-                        None,
-                        None,
-                        None,
-                    )
-                    .unwrap();
-
-                    wg_config::WgConf::create(wireguard_conf.as_str(), interface, None)
-                        .expect("failed to create config");
-
-                    info!("Created new Wireguard config");
-
-                    wg_config::WgConf::open(wireguard_conf.as_str()).unwrap()
-                } else {
-                    return Err((
-                        StatusCode::INTERNAL_SERVER_ERROR,
-                        "failed to open server Wireguard config",
-                    ));
-                }
-            }
-        };
-        let mut public_ip = None;
-        if let Some(ip) = ip {
-            match server_peer.peers() {
-                Ok(peers) => {
-                    for peer in peers {
-                        let peer_ip = peer.allowed_ips();
-                        if ip.is_empty() {
-                            continue;
-                        }
-                        if peer_ip[0].to_string() == ip {
-                            info!("Found peer with IP {}", ip);
-
-                            public_ip = Some(peer.public_key().to_owned());
-                        }
-                    }
-                }
+        let cloned_udid = udid.clone();
+        (client_config, ip_final) =
+            match tokio::task::spawn_blocking(move || generate_wireguard_peer(&cloned_udid, ip))
+                .await
+            {
+                Ok(r) => r?,
                 Err(e) => {
-                    info!("Failed to get peers: {:?}", e);
-                    return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to get peers"));
+                    info!("Failed to generate Wireguard peer: {:?}", e);
+                    return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to generate peer"));
                 }
-            }
-        }
-
-        if let Some(public_ip) = public_ip {
-            info!("Removing existing peer");
-            server_peer = server_peer.remove_peer_by_pub_key(&public_ip).unwrap();
-        }
-
-        info!("Generating IPv6 from UDID");
-        let ip = generate_ipv6_from_udid(udid.as_str());
-        ip_final = ip;
-
-        // Generate a new peer for the device
-        info!("Generating peer");
-        client_config = match server_peer.generate_peer(
-            std::net::IpAddr::V6(ip),
-            wireguard_endpoint.parse().unwrap(),
-            vec![wireguard_server_allowed_ips.parse().unwrap()],
-            None,
-            true,
-            Some(20),
-        ) {
-            Ok(config) => config.to_string().as_bytes().to_vec(),
-            Err(e) => {
-                info!("Failed to generate peer: {:?}", e);
-                return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to generate peer"));
-            }
-        };
+            };
     } else if register_mode == 2 {
         // register directly using request IP
         ip_final = match client_ip.0 {
@@ -265,40 +161,160 @@ pub async fn register(
         (StatusCode::INTERNAL_SERVER_ERROR, "failed to save plist")
     })?;
 
-    // Save the IP to the database
-    tokio::task::spawn_blocking(move || {
-        let db = match sqlite::open("jitstreamer.db") {
+    // Save the IP to the database, and cache it once it's actually stored so the device's
+    // first requests after registering don't need the database
+    let cloned_udid = udid.clone();
+    let saved = tokio::task::spawn_blocking(move || {
+        let db = match crate::db::open() {
             Ok(db) => db,
             Err(e) => {
                 info!("Failed to open database: {:?}", e);
-                return;
+                return false;
             }
         };
 
         // Insert the device into the database
-        let query = "INSERT INTO devices (udid, ip, last_used) VALUES (?, ?, CURRENT_TIMESTAMP)";
+        let query = crate::db::INSERT_DEVICE;
         let mut statement = match crate::db::db_prepare(&db, query) {
             Some(s) => s,
             None => {
                 log::error!("Failed to prepare query!");
-                return;
+                return false;
             }
         };
         statement
-            .bind(&[(1, udid.as_str()), (2, ip_final.to_string().as_str())][..])
+            .bind(
+                &[
+                    (1, cloned_udid.as_str()),
+                    (2, ip_final.to_string().as_str()),
+                ][..],
+            )
             .unwrap();
         if crate::db::statement_next(&mut statement).is_none() {
             log::error!("Failed to enact the statement");
+            return false;
         }
-    });
+        true
+    })
+    .await
+    .unwrap_or(false);
+    if !saved {
+        return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to save device"));
+    }
+    crate::common::cache_udid(ip_final.to_string(), udid);
 
     if register_mode == 1 {
-        refresh_wireguard(ip_final.to_string());
+        // The client still has to import its config, so don't hold the response for this
+        tokio::task::spawn(refresh_wireguard(ip_final.to_string()));
     }
 
     Ok(client_config.into())
 }
 
+/// Swaps the device's Wireguard peer for a fresh one, returning the client config and its IP.
+/// This is all blocking file IO, so it runs on the blocking pool.
+fn generate_wireguard_peer(
+    udid: &str,
+    ip: Option<String>,
+) -> Result<(Vec<u8>, Ipv6Addr), (StatusCode, &'static str)> {
+    let wireguard_config_name =
+        std::env::var("WIREGUARD_CONFIG_NAME").unwrap_or("jitstreamer".to_string());
+    let wireguard_conf = format!("/etc/wireguard/{wireguard_config_name}.conf");
+    let wireguard_port = std::env::var("WIREGUARD_PORT")
+        .unwrap_or("51869".to_string())
+        .parse::<u16>()
+        .unwrap_or(51869);
+    let wireguard_server_address =
+        std::env::var("WIREGUARD_SERVER_ADDRESS").unwrap_or("fd00::/128".to_string());
+    let wireguard_endpoint =
+        std::env::var("WIREGUARD_ENDPOINT").unwrap_or("jitstreamer.jkcoxson.com".to_string());
+    let wireguard_server_allowed_ips =
+        std::env::var("WIREGUARD_SERVER_ALLOWED_IPS").unwrap_or("fd00::/64".to_string());
+
+    // Read the Wireguard config file
+    info!("Reading Wireguard server config");
+    let mut server_peer = match wg_config::WgConf::open(&wireguard_conf) {
+        Ok(conf) => conf,
+        Err(e) => {
+            info!("Failed to open Wireguard config: {:?}", e);
+            if let wg_config::WgConfError::NotFound(_) = e {
+                // Generate a new one
+
+                let key = wg_config::WgKey::generate_private_key().expect("failed to generate key");
+                let interface = wg_config::WgInterface::new(
+                    key,
+                    wireguard_server_address.parse().unwrap(),
+                    Some(wireguard_port),
+                    None,
+                    None,
+                    None,
+                )
+                .unwrap();
+
+                wg_config::WgConf::create(wireguard_conf.as_str(), interface, None)
+                    .expect("failed to create config");
+
+                info!("Created new Wireguard config");
+
+                wg_config::WgConf::open(wireguard_conf.as_str()).unwrap()
+            } else {
+                return Err((
+                    StatusCode::INTERNAL_SERVER_ERROR,
+                    "failed to open server Wireguard config",
+                ));
+            }
+        }
+    };
+    let mut public_ip = None;
+    if let Some(ip) = ip {
+        match server_peer.peers() {
+            Ok(peers) => {
+                for peer in peers {
+                    let peer_ip = peer.allowed_ips();
+                    if ip.is_empty() {
+                        continue;
+                    }
+                    if peer_ip[0].to_string() == ip {
+                        info!("Found peer with IP {}", ip);
+
+                        public_ip = Some(peer.public_key().to_owned());
+                    }
+                }
+            }
+            Err(e) => {
+                info!("Failed to get peers: {:?}", e);
+                return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to get peers"));
+            }
+        }
+    }
+
+    if let Some(public_ip) = public_ip {
+        info!("Removing existing peer");
+        server_peer = server_peer.remove_peer_by_pub_key(&public_ip).unwrap();
+    }
+
+    info!("Generating IPv6 from UDID");
+    let ip = generate_ipv6_from_udid(udid);
+
+    // Generate a new peer for the device
+    info!("Generating peer");
+    let client_config = match server_peer.generate_peer(
+        std::net::IpAddr::V6(ip),
+        wireguard_endpoint.parse().unwrap(),
+        vec![wireguard_server_allowed_ips.parse().unwrap()],
+        None,
+        true,
+        Some(20),
+    ) {
+        Ok(config) => config.to_string().as_bytes().to_vec(),
+        Err(e) => {
+            info!("Failed to generate peer: {:?}", e);
+            return Err((StatusCode::INTERNAL_SERVER_ERROR, "failed to generate peer"));
+        }
+    };
+    Ok((client_config, ip))
+}
+
 const UPLOAD_HTML: &str = include_str!("../src/upload.html");
 
 pub async fn upload() -> Result<Html<&'static str>, (StatusCode, &'static str)> {
@@ -329,25 +345,40 @@ fn generate_ipv6_from_udid(udid: &str) -> std::net::Ipv6Addr {
     std::net::Ipv6Addr::from(segments)
 }
 
-fn refresh_wireguard(ip: String) {
+async fn refresh_wireguard(ip: String) {
     let wireguard_config_name =
         std::env::var("WIREGUARD_CONFIG_NAME").unwrap_or("jitstreamer".to_string());
 
     // wg syncconf jitstreamer <(wg-quick strip jitstreamer)
-    let output = std::process::Command::new("bash")
-        .arg("-c")
-        .arg(format!(
-            "wg syncconf jitstreamer <(wg-quick strip {wireguard_config_name})"
-        ))
-        .output()
-        .expect("failed to execute process");
-    info!("Refreshing Wireguard: {:?}", output);
+    let syncconf = format!("wg syncconf jitstreamer <(wg-quick strip {wireguard_config_name})");
+    if !run_command(&syncconf).await {
+        // The peer isn't live, so there's nothing to route to yet
+        return;
+    }
 
     // ip route add fd00::b36d:f867:9391:fb0a dev jitstreamer
-    let output = std::process::Command::new("bash")
+    run_command(&format!("ip route add {ip} dev {wireguard_config_name}")).await;
+}
+
+/// Runs a shell command, logging instead of panicking since nobody waits on this task
+async fn run_command(command: &str) -> bool {
+    match tokio::process::Command::new("bash")
         .arg("-c")
-        .arg(format!("ip route add {ip} dev {wireguard_config_name}"))
+        .arg(command)
         .output()
-        .expect("failed to add IP route");
-    info!("Adding route: {:?}", output);
+        .await
+    {
+        Ok(output) if output.status.success() => {
+            info!("Ran `{command}`: {:?}", output);
+            true
+        }
+        Ok(output) => {
+            log::error!("`{command}` failed: {:?}", output);
+            false
+        }
+        Err(e) => {
+            log::error!("Failed to run `{command}`: {e:?}");
+            false
+        }
+    }
 }
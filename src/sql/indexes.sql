@@ -0,0 +1,4 @@
+-- Run on every startup so databases created before these existed pick them up
+
+-- Registration looks devices up by udid, ip is already the primary key
+create index if not exists idx_devices_udid on devices (udid);